@@ -0,0 +1,348 @@
+"""
+mqtt_app.py — asyncio/paho-mqtt glue shared by the publisher and subscriber GUIs
+--------------------------------------------------------------------------------
+- Drives Tk from an asyncio loop instead of mainloop()
+- Services each paho-mqtt socket from that loop (no loop_start() network thread)
+- Resolves and dials the broker, and redials it with exponential backoff
+"""
+
+import tkinter as tk
+import asyncio
+import concurrent.futures
+import select
+import socket
+import time
+import string
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+DEFAULT_BROKER = "test.mosquitto.org"
+DEFAULT_PORT = 1883
+TOPIC_PREFIX = "twitter/"  # final topic will be twitter/<hashtag>
+TWEET_SEPARATOR = "\x1e"  # ASCII record separator between the tweets of one batch payload
+HASHTAG_HINT = "(e.g., #iot or iot)"
+VALIDATE_DELAY_MS = 150  # debounce for the live hashtag preview
+MAX_LOG_LINES = 5000  # older lines are trimmed so the log widget stays bounded
+DEFAULT_POLL_INTERVAL_MS = 10  # how often the asyncio loop lets Tk process events
+MIN_POLL_INTERVAL_MS = 1  # Refresh (ms) entries are clamped to this range; much slower and
+MAX_POLL_INTERVAL_MS = 250  # the window stops responding to the keystrokes needed to fix it
+MQTT_PUMP_BUDGET_MS = 5  # max time one pump pass keeps reading before yielding the loop
+MAX_IDLE_POLL_MS = 500  # socket pump interval ceiling once the connection goes quiet
+RECONNECT_MIN_DELAY = 1  # seconds; doubled after each failed reconnect ...
+RECONNECT_MAX_DELAY = 180  # ... up to this cap
+DNS_CACHE_TTL = 300  # seconds a resolved broker address is reused across reconnects
+
+_HASHTAG_CHARS = string.ascii_letters + string.digits + "_-"
+# ASCII bytes that bytes.translate() drops; non-ASCII is dropped by encode("ascii", "ignore")
+_INVALID_TAG_BYTES = bytes(c for c in range(128) if chr(c) not in _HASHTAG_CHARS)
+
+
+def sanitize_hashtag(tag: str) -> str:
+    """
+    Normalize hashtag text:
+      - remove leading '#' and whitespace
+      - replace spaces with underscores
+      - allow only letters, numbers, underscore, dash
+    """
+    tag = tag.strip()
+    if tag.startswith("#"):
+        tag = tag[1:]
+    tag = "_".join(tag.split())
+    return tag.encode("ascii", "ignore").translate(None, _INVALID_TAG_BYTES).decode("ascii")
+
+
+class MqttTkApp(tk.Tk):
+    """
+    Base window for both apps. Subclasses build the widgets used here
+    (connect_btn, status_lbl, poll_var, hashtag_var, tag_hint_lbl), provide
+    _log() and _clients(), and handle on_connect/on_disconnect themselves.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # State
+        self.connected = False
+        self.poll_interval_ms = DEFAULT_POLL_INTERVAL_MS
+        self.loop = None  # asyncio loop, set once tk_loop() starts
+        self._closed = False
+        self._validate_id = None  # pending after() id for the hashtag preview
+        self._tasks = set()
+        # One long-lived thread for paho's blocking connect calls, rather than a
+        # fresh thread (and stack) per connect attempt.
+        self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="mqtt-io")
+        self._pump_handles = {}  # client -> pending _pump_mqtt() timer
+        self._idle_streaks = {}  # client -> consecutive pump ticks with no socket traffic
+        self._read_fds = {}  # client -> socket fd whose readability wakes the pump
+        self._want_connection = False  # the user asked to be connected (Connect clicked, not since Disconnect)
+        self._reconnect_task = None
+        self._redial_result = None  # future the backoff task awaits until the broker answers a redial
+        self._reconnect_delay = RECONNECT_MIN_DELAY
+        self._broker = (DEFAULT_BROKER, DEFAULT_PORT)  # last host/port the user connected to
+        self._dns_cache = {}  # (host, port) -> (ips, expiry)
+
+    def _clients(self):
+        """Every mqtt.Client the app owns, connected or not."""
+        raise NotImplementedError
+
+    def _clients_to_dial(self):
+        return self._clients()
+
+    def _log(self, msg: str):
+        raise NotImplementedError
+
+    def _attach(self, client):
+        """Route a client's connection and socket callbacks onto the app loop."""
+        client.on_connect = self._from_paho(self._on_connect)
+        client.on_disconnect = self._from_paho(self._on_disconnect)
+        client.on_socket_open = self._from_paho(self._on_socket_open)
+        client.on_socket_close = self._from_paho(self._on_socket_close)
+
+    def _schedule_validate(self, *_):
+        # Collapse a burst of keystrokes into one sanitize/preview pass.
+        if self._validate_id:
+            self.after_cancel(self._validate_id)
+        self._validate_id = self.after(VALIDATE_DELAY_MS, self._validate_tag)
+
+    def _validate_tag(self):
+        self._validate_id = None
+        raw = self.hashtag_var.get()
+        tag = sanitize_hashtag(raw)
+        if tag:
+            self.tag_hint_lbl.config(text=f"→ {TOPIC_PREFIX}{tag}", foreground="")
+        elif raw.strip():
+            self.tag_hint_lbl.config(text="Invalid hashtag", foreground="red")
+        else:
+            self.tag_hint_lbl.config(text=HASHTAG_HINT, foreground="")
+
+    # ---------- asyncio glue ----------
+    async def tk_loop(self):
+        """
+        Drive Tk from asyncio instead of mainloop(), so MQTT I/O shares one thread.
+        Never open a modal dialog (messagebox) from the app: its nested Tk loop
+        starves asyncio, so no socket pump or keepalive runs until it closes.
+        """
+        self.loop = asyncio.get_running_loop()
+        while not self._closed:
+            self.update()
+            await asyncio.sleep(self.poll_interval_ms / 1000)
+
+    def _on_poll_interval_change(self, *_):
+        try:
+            value = int(self.poll_var.get())
+        except (tk.TclError, ValueError):
+            return  # half-typed entry; keep the previous interval
+        self.poll_interval_ms = min(max(value, MIN_POLL_INTERVAL_MS), MAX_POLL_INTERVAL_MS)
+
+    def _on_close(self):
+        self._closed = True
+        self._cancel_reconnect()
+        self._disconnect_clients()
+        # Handlers that disconnect() just queued would run against destroyed widgets.
+        for task in list(self._tasks):
+            task.cancel()
+        self._io_pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
+    def _spawn(self, coro):
+        """Schedule a coroutine on the app loop, keeping a reference until it finishes."""
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _from_paho(self, handler):
+        """
+        Wrap a handler for use as a paho callback. paho may call it from the
+        connect executor thread, so hop onto the loop unless we're already there.
+        Coroutine handlers are spawned as tasks.
+        """
+        def callback(*args):
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is self.loop:
+                self._dispatch(handler, args)
+            elif not self.loop.is_closed():  # paho's __del__ may close a socket after asyncio.run() ends
+                self.loop.call_soon_threadsafe(self._dispatch, handler, args)
+        return callback
+
+    def _dispatch(self, handler, args):
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            self._spawn(result)
+
+    # ---------- MQTT socket pump ----------
+    def _on_socket_open(self, client, userdata, sock):
+        self._stop_pump(client)
+        self._pump_handles[client] = self.loop.call_soon(self._pump_mqtt, client)
+        try:
+            self.loop.add_reader(sock, self._wake_pump, client)
+            self._read_fds[client] = sock.fileno()
+        except NotImplementedError:
+            pass  # e.g. the Windows Proactor loop: the pump polls reads on its timer alone
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._stop_pump(client)
+        fd = self._read_fds.pop(client, None)
+        if fd is not None:
+            self.loop.remove_reader(fd)  # by fd: paho may have closed sock already
+
+    def _stop_pump(self, client):
+        handle = self._pump_handles.pop(client, None)
+        if handle:
+            handle.cancel()
+
+    def _wake_pump(self, client):
+        """Poll a client's socket right away: data arrived, or a packet was handed to it."""
+        self._idle_streaks[client] = 0
+        if client in self._pump_handles:
+            self._stop_pump(client)
+            self._pump_handles[client] = self.loop.call_soon(self._pump_mqtt, client)
+
+    def _pump_mqtt(self, client):
+        """
+        Service the MQTT socket from the asyncio loop (reads, writes, keepalive)
+        instead of a loop_start() thread. A timer plus a zero-timeout select()
+        works with every event loop, including the Windows Proactor default.
+        Reads continue while the socket stays readable, bounded by a time budget
+        rather than a packet count, so a flood drains at full speed.
+        """
+        self._pump_handles.pop(client, None)
+        sock = client.socket()
+        if sock is None:
+            return  # closed; _on_socket_open restarts the pump
+        busy = more = False
+        deadline = time.monotonic() + MQTT_PUMP_BUDGET_MS / 1000
+        while select.select([sock], [], [], 0)[0]:
+            busy = True
+            if client.loop_read() != mqtt.MQTT_ERR_SUCCESS:
+                break
+            if time.monotonic() >= deadline:
+                more = True  # still backlogged: give the loop a turn, then come straight back
+                break
+        # One loop_write() per tick, never a loop around it: each call already
+        # flushes the whole outgoing deque. Repeating it while want_write() is
+        # still true (socket buffer full) only spins, and the old paho
+        # max_packets = len(queue) logic made that O(N^2) (paho-python #18).
+        if client.want_write():
+            busy = True
+            if client.loop_write() != mqtt.MQTT_ERR_SUCCESS:
+                return  # connection dropped while servicing it
+        if client.loop_misc() != mqtt.MQTT_ERR_SUCCESS:
+            return  # connection dropped while servicing it
+        # Adaptive back-off: poll at the refresh rate while traffic flows, then
+        # stretch the interval towards MAX_IDLE_POLL_MS while the socket is quiet.
+        # That only spaces out the keepalive checks: incoming data wakes the pump
+        # through add_reader() and sending wakes it too. Without add_reader()
+        # (Windows Proactor loop) it keeps polling at the refresh rate, so a read
+        # never waits out the back-off.
+        idle = not busy and client in self._read_fds
+        streak = self._idle_streaks.get(client, 0) + 1 if idle else 0
+        self._idle_streaks[client] = streak
+        delay_ms = max(self.poll_interval_ms, min(MAX_IDLE_POLL_MS, self.poll_interval_ms * streak))
+        if more:
+            self._pump_handles[client] = self.loop.call_soon(self._pump_mqtt, client)
+        else:
+            self._pump_handles[client] = self.loop.call_later(delay_ms / 1000, self._pump_mqtt, client)
+
+    # ---------- MQTT ----------
+    def _disconnect_clients(self):
+        # Every client, not just confirmed ones: a link still waiting for its
+        # CONNACK holds a socket too. Clients without one return MQTT_ERR_NO_CONN.
+        for client in self._clients():
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    async def _connect_async(self, broker, port):
+        links = len(self._clients())
+        self._log(f"Connecting to {broker}:{port} ..." + (f" ({links} connections)" if links > 1 else ""))
+        self.status_lbl.config(text="Status: Connecting...", foreground="orange")
+
+        self._broker = (broker, port)
+        try:
+            await self._dial()
+        except Exception as e:
+            self._set_error(f"Connection failed: {e}")
+
+    async def _dial(self):
+        """Resolve the broker on the asyncio loop, then dial it with every client not yet up."""
+        broker, port = self._broker
+        ips = await self._resolve(broker, port)
+        pending = self._clients_to_dial()
+        results = await asyncio.gather(*(self._dial_client(c, ips, port) for c in pending), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            # Re-resolve on the next attempt rather than retrying dead addresses for DNS_CACHE_TTL.
+            self._dns_cache.pop((broker, port), None)
+            raise errors[0]
+
+    async def _dial_client(self, client, ips, port):
+        """Try each resolved address in turn, as socket.create_connection() would for a hostname."""
+        for ip in ips:
+            # connect_async() only records the target; reconnect() then dials it. That
+            # keeps each client (and its callbacks) alive for later reconnects.
+            client.connect_async(ip, port, keepalive=60)
+            try:
+                # reconnect() still does a blocking TCP handshake; keep it off the loop.
+                # No loop_start(): _pump_mqtt() services each socket from the asyncio loop.
+                await self.loop.run_in_executor(self._io_pool, client.reconnect)
+                return
+            except OSError as e:
+                error = e  # e.g. ::1 refused by an IPv4-only broker; try the next address
+        raise error
+
+    async def _resolve(self, host, port):
+        """
+        Look up host via loop.getaddrinfo() so a slow or dead DNS server cannot stall
+        paho's connect; results are cached for DNS_CACHE_TTL to absorb reconnect storms.
+        """
+        cached = self._dns_cache.get((host, port))
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        infos = await self.loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        ips = list(dict.fromkeys(info[4][0] for info in infos))  # dedupe, keep resolver order
+        self._dns_cache[(host, port)] = (ips, time.monotonic() + DNS_CACHE_TTL)
+        return ips
+
+    async def _reconnect_with_backoff(self):
+        """
+        Redial the broker after an unexpected drop, backing off exponentially. A dial
+        that gets through is not yet a success: the task stays up until _on_connect
+        reports the CONNACK, so a broker that closes a link first or refuses it
+        just costs another round.
+        """
+        try:
+            while not self.connected:
+                delay = self._reconnect_delay
+                self._reconnect_delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                self.status_lbl.config(text=f"Status: Reconnecting in {delay}s...", foreground="orange")
+                await asyncio.sleep(delay)
+                self._redial_result = self.loop.create_future()
+                try:
+                    await self._dial()
+                except Exception as e:
+                    self._log(f"Reconnect failed: {e}")
+                    continue
+                await self._redial_result  # resolved by _on_connect / _on_disconnect
+        finally:
+            self._reconnect_task = None
+            self._redial_result = None
+
+    def _cancel_reconnect(self):
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+    def _settle_redial(self):
+        """Wake the backoff task once the broker has answered (or dropped) its redial."""
+        if self._redial_result and not self._redial_result.done():
+            self._redial_result.set_result(None)
+            return True
+        return False
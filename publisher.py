@@ -4,66 +4,82 @@ publisher.py — MQTT "Twitter-like" Publisher GUI
 -------------------------------------------------
 - Lets a user post a tweet to a hashtag (MQTT topic)
 - Uses Tkinter for the GUI
-- Uses paho-mqtt for MQTT client
+- Uses paho-mqtt for MQTT client, driven from asyncio (no loop_start() network thread)
 - Publishes messages in the format: "<username>: <tweet_message>"
+  (in batch mode each line is a tweet, and a batch shares one message, separated by "\x1e")
 
 Default broker: test.mosquitto.org (public). You may replace with a local broker.
 """
 
 import tkinter as tk
-from tkinter import messagebox
 from tkinter import ttk
-import threading
-import queue
+import asyncio
 import time
-import re
-
-try:
-    import paho.mqtt.client as mqtt
-except ImportError:
-    mqtt = None
-
-DEFAULT_BROKER = "test.mosquitto.org"
-DEFAULT_PORT = 1883
-TOPIC_PREFIX = "twitter/"  # final topic will be twitter/<hashtag>
-
-
-def sanitize_hashtag(tag: str) -> str:
-    """
-    Normalize hashtag text:
-      - remove leading '#' and whitespace
-      - replace spaces with underscores
-      - allow only letters, numbers, underscore, dash
-    """
-    tag = tag.strip()
-    if tag.startswith("#"):
-        tag = tag[1:]
-    tag = re.sub(r"\s+", "_", tag)
-    tag = re.sub(r"[^A-Za-z0-9_\-]", "", tag)
-    return tag
-
-
-class PublisherApp(tk.Tk):
+import uuid
+
+from mqtt_app import (
+    DEFAULT_BROKER, DEFAULT_PORT, TOPIC_PREFIX, TWEET_SEPARATOR, HASHTAG_HINT, MAX_LOG_LINES,
+    RECONNECT_MIN_DELAY, MqttTkApp, mqtt, sanitize_hashtag,
+)
+
+DEFAULT_POOL_SIZE = 1  # MQTT connections tweets are sharded across (one socket each)
+MAX_INFLIGHT_PUBLISHES = 1000  # refuse new tweets while this many are still buffered by paho
+
+
+class PublisherApp(MqttTkApp):
     def __init__(self):
         super().__init__()
         self.title("MQTT Twitter — Publisher")
-        self.geometry("520x420")
+        self.geometry("520x460")
         self.resizable(False, False)
 
-        # State
-        self.client = None
-        self.connected = False
-        self.status_queue = queue.Queue()
+        # State, on top of MqttTkApp's (self.connected: every client in the pool is connected)
+        self._client_pool = []  # one mqtt.Client per connection; tweets are sharded by topic
+        self._connected_clients = set()
+        self._inflight = {}  # client -> publishes handed to paho but not yet confirmed by on_publish
+        self._inflight_cap = MAX_INFLIGHT_PUBLISHES
 
         self._build_ui()
-        self._init_mqtt()  # (no-op placeholder; kept for symmetry/future use)
-
-        # Poll status queue to update GUI without blocking
-        self.after(100, self._drain_status_queue)
+        self._init_mqtt()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _init_mqtt(self):
-        """Placeholder for future MQTT setup (no-op)."""
-        return
+        """Create the MQTT client pool that is reused across every connect/reconnect."""
+        if not mqtt:
+            return  # reported when the user clicks Connect
+        self._build_pool(DEFAULT_POOL_SIZE)
+
+    def _build_pool(self, size: int):
+        # Client IDs must be unique on the broker (test.mosquitto.org is shared),
+        # so prefix them with a random per-pool tag.
+        pool_tag = uuid.uuid4().hex[:8]
+        self._discard_pool()
+        for i in range(size):
+            client = mqtt.Client(client_id=f"pub-{pool_tag}-{i}")
+            self._attach(client)
+            client.on_publish = self._from_paho(self._on_publish)
+            self._client_pool.append(client)
+            self._inflight[client] = 0
+
+    def _discard_pool(self):
+        """Close the current pool's sockets and forget every piece of per-client state."""
+        self._disconnect_clients()
+        for client in self._client_pool:
+            self._stop_pump(client)
+            self._idle_streaks.pop(client, None)
+            self._inflight.pop(client, None)
+        self._connected_clients.clear()
+        self._client_pool = []
+
+    def _clients(self):
+        return self._client_pool
+
+    def _clients_to_dial(self):
+        return [c for c in self._client_pool if c not in self._connected_clients]
+
+    def _client_for(self, topic: str):
+        """Pin each topic to one pool client, keeping per-topic order (not cross-topic)."""
+        return self._client_pool[hash(topic) % len(self._client_pool)]
 
     def _build_ui(self):
         pad = {"padx": 12, "pady": 8}
@@ -80,11 +96,20 @@ class PublisherApp(tk.Tk):
         self.port_var = tk.IntVar(value=DEFAULT_PORT)
         ttk.Entry(con_frame, textvariable=self.port_var, width=8).grid(row=0, column=3, **pad)
 
-        self.connect_btn = ttk.Button(con_frame, text="Connect", command=self._toggle_connection)
+        self.connect_btn = ttk.Button(con_frame, text="Connect", command=lambda: self._spawn(self._toggle_connection()))
         self.connect_btn.grid(row=0, column=4, **pad)
 
         self.status_lbl = ttk.Label(con_frame, text="Status: Disconnected", foreground="red")
-        self.status_lbl.grid(row=1, column=0, columnspan=5, sticky="w", padx=12, pady=(0, 10))
+        self.status_lbl.grid(row=1, column=0, columnspan=2, sticky="w", padx=12, pady=(0, 10))
+
+        ttk.Label(con_frame, text="Refresh (ms):").grid(row=1, column=2, sticky="w", padx=12, pady=(0, 10))
+        self.poll_var = tk.IntVar(value=self.poll_interval_ms)
+        self.poll_var.trace_add("write", self._on_poll_interval_change)
+        ttk.Entry(con_frame, textvariable=self.poll_var, width=8).grid(row=1, column=3, padx=12, pady=(0, 10))
+
+        ttk.Label(con_frame, text="Connections:").grid(row=2, column=2, sticky="w", padx=12, pady=(0, 10))
+        self.pool_size_var = tk.IntVar(value=DEFAULT_POOL_SIZE)
+        ttk.Entry(con_frame, textvariable=self.pool_size_var, width=8).grid(row=2, column=3, padx=12, pady=(0, 10))
 
         # Publish frame
         pub_frame = ttk.LabelFrame(self, text="Publish Tweet")
@@ -97,14 +122,18 @@ class PublisherApp(tk.Tk):
         ttk.Label(pub_frame, text="Hashtag:").grid(row=1, column=0, sticky="w", **pad)
         self.hashtag_var = tk.StringVar()
         ttk.Entry(pub_frame, textvariable=self.hashtag_var, width=24).grid(row=1, column=1, **pad, sticky="w")
-        ttk.Label(pub_frame, text="(e.g., #iot or iot)").grid(row=1, column=2, sticky="w", padx=0)
+        self.tag_hint_lbl = ttk.Label(pub_frame, text=HASHTAG_HINT, width=22)
+        self.tag_hint_lbl.grid(row=1, column=2, sticky="w", padx=0)
+        self.hashtag_var.trace_add("write", self._schedule_validate)
 
         ttk.Label(pub_frame, text="Tweet:").grid(row=2, column=0, sticky="nw", **pad)
         self.tweet_text = tk.Text(pub_frame, height=5, width=45, wrap="word")
         self.tweet_text.grid(row=2, column=1, columnspan=2, **pad)
 
-        self.publish_btn = ttk.Button(pub_frame, text="Publish Tweet", command=self._publish)
+        self.publish_btn = ttk.Button(pub_frame, text="Publish Tweet", command=lambda: self._spawn(self._publish()))
         self.publish_btn.grid(row=3, column=1, sticky="e", padx=12, pady=(0, 8))
+        self.batch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(pub_frame, text="Batch: one per line", variable=self.batch_var).grid(row=3, column=2, sticky="w", pady=(0, 8))
 
         # Log frame
         log_frame = ttk.LabelFrame(self, text="Log")
@@ -115,19 +144,21 @@ class PublisherApp(tk.Tk):
     def _log(self, msg: str):
         self.log_text.configure(state="normal")
         self.log_text.insert("end", time.strftime("[%H:%M:%S] ") + msg + "\n")
+        lines_now = int(self.log_text.index("end-1c").split(".")[0])
+        if lines_now > MAX_LOG_LINES:
+            self.log_text.delete("1.0", f"{lines_now - MAX_LOG_LINES}.0")
         self.log_text.see("end")
         self.log_text.configure(state="disabled")
 
     # ---------- MQTT ----------
-    def _toggle_connection(self):
+    async def _toggle_connection(self):
         if not mqtt:
-            messagebox.showerror("Missing dependency", "paho-mqtt is not installed.\n\npip install paho-mqtt")
+            self._set_error("paho-mqtt is not installed — pip install paho-mqtt")
             return
-        if self.connected:
-            try:
-                self.client.disconnect()
-            except Exception:
-                pass
+        if self.connected or self._reconnect_task:
+            self._want_connection = False
+            self._cancel_reconnect()
+            self._disconnect_clients()
             self.connected = False
             self.connect_btn.config(text="Connect")
             self.status_lbl.config(text="Status: Disconnected", foreground="red")
@@ -135,87 +166,134 @@ class PublisherApp(tk.Tk):
         else:
             broker = self.broker_var.get().strip()
             port = int(self.port_var.get() or DEFAULT_PORT)
-            self._connect_async(broker, port)
-
-    def _connect_async(self, broker, port):
-        self._log(f"Connecting to {broker}:{port} ...")
-        self.status_lbl.config(text="Status: Connecting...", foreground="orange")
-
-        def worker():
             try:
-                self.client = mqtt.Client()
-                self.client.on_connect = self._on_connect
-                self.client.on_disconnect = self._on_disconnect
-                self.client.connect(broker, port, keepalive=60)
-                # Start background network loop
-                self.client.loop_start()
-            except Exception as e:
-                self.status_queue.put(("error", f"Connection failed: {e}"))
-
-        threading.Thread(target=worker, daemon=True).start()
-
-    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+                size = max(1, int(self.pool_size_var.get()))
+            except (tk.TclError, ValueError):
+                size = DEFAULT_POOL_SIZE
+            if size != len(self._client_pool):
+                self._build_pool(size)
+            self._want_connection = True
+            await self._connect_async(broker, port)
+
+    async def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if self._closed:
+            return  # the window is gone
+        if client not in self._client_pool:
+            client.disconnect()  # finished connecting after its pool was rebuilt
+            return
+        if not self._want_connection:
+            client.disconnect()  # a redial that was still in flight when the user clicked Disconnect
+            return
         if reason_code == 0:
-            self.status_queue.put(("connected", "Connected to broker."))
+            self._connected_clients.add(client)
+            self._inflight[client] = 0  # anything unconfirmed died with this link's previous session
+            if len(self._connected_clients) < len(self._client_pool):
+                return  # wait for the rest of the pool
+            self.connected = True
+            self._reconnect_delay = RECONNECT_MIN_DELAY
+            self._settle_redial()
+            self.connect_btn.config(text="Disconnect")
+            self.status_lbl.config(text="Status: Connected", foreground="green")
+            self._log("Connected to broker.")
+        elif self._reconnect_task:
+            self._log(f"Reconnect refused (code {reason_code}).")
+            self._settle_redial()
         else:
-            self.status_queue.put(("error", f"Failed to connect. Code: {reason_code}"))
-
-    def _on_disconnect(self, client, userdata, reason_code, properties=None):
-        self.status_queue.put(("disconnected", "Disconnected from broker."))
-
-    def _drain_status_queue(self):
-        try:
-            while True:
-                kind, msg = self.status_queue.get_nowait()
-                if kind == "connected":
-                    self.connected = True
-                    self.connect_btn.config(text="Disconnect")
-                    self.status_lbl.config(text="Status: Connected", foreground="green")
-                    self._log(msg)
-                elif kind == "disconnected":
-                    self.connected = False
-                    self.connect_btn.config(text="Connect")
-                    self.status_lbl.config(text="Status: Disconnected", foreground="red")
-                    self._log(msg)
-                elif kind == "error":
-                    self.connected = False
-                    self.connect_btn.config(text="Connect")
-                    self.status_lbl.config(text=f"Status: Error — see log", foreground="red")
-                    self._log(msg)
-        except queue.Empty:
-            pass
-        finally:
-            self.after(150, self._drain_status_queue)
-
-    def _publish(self):
-        if not self.connected or not self.client:
-            messagebox.showwarning("Not connected", "Please connect to a broker first.")
+            self._set_error(f"Failed to connect. Code: {reason_code}")
+
+    async def _on_disconnect(self, client, userdata, reason_code, properties=None):
+        if self._closed:
+            return  # the window is gone
+        if client not in self._client_pool:
+            return  # a client from a pool that has since been rebuilt
+        self._connected_clients.discard(client)
+        was_connected = self.connected
+        self.connected = False
+        if not self._want_connection:
+            return  # Disconnect was clicked or the connect failed; the window already says so
+        if reason_code != 0 and was_connected:
+            # Unexpected drop: keep the client and redial it with backoff.
+            self._log(f"Connection lost (code {reason_code}).")
+            self._reconnect_task = self._spawn(self._reconnect_with_backoff())
+            return
+        if self._reconnect_task:
+            # A redial the broker closed before its CONNACK: let the task back off and retry.
+            if reason_code != 0 and self._settle_redial():
+                self._log(f"Reconnect failed: connection closed (code {reason_code}).")
+            return
+        if self._connected_clients:
+            return  # other pool clients are still up
+        self._want_connection = False
+        self.connect_btn.config(text="Connect")
+        self.status_lbl.config(text="Status: Disconnected", foreground="red")
+        self._log("Disconnected from broker.")
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        if client in self._inflight:  # not a client from a pool that has since been rebuilt
+            self._inflight[client] -= 1
+
+    def _set_error(self, msg: str):
+        self.connected = False
+        self._want_connection = False
+        self.connect_btn.config(text="Connect")
+        self.status_lbl.config(text="Status: Error — see log", foreground="red")
+        self._log(msg)
+
+    async def _publish(self):
+        if not self.connected or not self._client_pool:
+            self._log("Not connected — please connect to a broker first.")
             return
-        username = self.username_var.get().strip() or "anonymous"
+        # The separator frames batch payloads, so it may not appear inside a tweet.
+        username = self.username_var.get().replace(TWEET_SEPARATOR, "").strip() or "anonymous"
         hashtag = sanitize_hashtag(self.hashtag_var.get())
-        text = self.tweet_text.get("1.0", "end").strip()
+        text = self.tweet_text.get("1.0", "end").replace(TWEET_SEPARATOR, "").strip()
 
         if not hashtag:
-            messagebox.showwarning("Invalid hashtag", "Please enter a valid hashtag (e.g., #iot or iot).")
+            self._log("Invalid hashtag — please enter a valid hashtag (e.g., #iot or iot).")
             return
         if not text:
-            messagebox.showwarning("Empty tweet", "Please write something to publish.")
+            self._log("Empty tweet — please write something to publish.")
             return
 
         topic = f"{TOPIC_PREFIX}{hashtag}"
-        payload = f"{username}: {text}"
+        if self.batch_var.get():
+            # Batch mode: every line is a tweet, and the whole batch goes out as one
+            # message, amortizing the PUBLISH header and socket send over the burst.
+            tweets = [f"{username}: {line.strip()}" for line in text.splitlines() if line.strip()]
+        else:
+            tweets = [f"{username}: {text}"]
+        payload = TWEET_SEPARATOR.join(tweets)
+
+        queued = sum(self._inflight.values())
+        if queued >= self._inflight_cap:
+            # paho buffers unsent messages in RAM without limit; push back instead.
+            self._log(f"Backpressure — {queued} messages still queued, not publishing.")
+            return
 
+        client = self._client_for(topic)
+        # Count before publishing: on_publish may fire before publish() returns.
+        self._inflight[client] += 1
         try:
-            res = self.client.publish(topic, payload, qos=0, retain=False)
+            res = client.publish(topic, payload, qos=0, retain=False)
+            self._wake_pump(client)
             if res.rc == 0:
-                self._log(f"Published to '{topic}': {payload}")
+                if len(tweets) == 1:
+                    self._log(f"Published to '{topic}': {payload}")
+                else:
+                    self._log(f"Published {len(tweets)} tweets to '{topic}' in one message")
                 self.tweet_text.delete("1.0", "end")
             else:
+                self._inflight[client] -= 1
                 self._log(f"Publish failed (rc={res.rc})")
         except Exception as e:
+            self._inflight[client] -= 1
             self._log(f"Publish error: {e}")
 
 
-if __name__ == "__main__":
+async def main():
     app = PublisherApp()
-    app.mainloop()
+    await app.tk_loop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,59 +5,48 @@ subscriber.py — MQTT "Twitter-like" Subscriber GUI
 - Lets a user subscribe/unsubscribe to hashtags (MQTT topics)
 - Uses Tkinter for the GUI
 - Shows incoming tweets live in a scrollable text area
+- Runs Tk and the paho-mqtt socket on a single asyncio loop (no loop_start() network thread)
 """
 
 import tkinter as tk
-from tkinter import messagebox
 from tkinter import ttk
-import threading
-import queue
+import asyncio
 import time
-import re
 
-try:
-    import paho.mqtt.client as mqtt
-except ImportError:
-    mqtt = None
+from mqtt_app import (
+    DEFAULT_BROKER, DEFAULT_PORT, TWEET_SEPARATOR, HASHTAG_HINT, MAX_LOG_LINES, RECONNECT_MIN_DELAY,
+    TOPIC_PREFIX, MqttTkApp, mqtt, sanitize_hashtag,
+)
 
-DEFAULT_BROKER = "test.mosquitto.org"
-DEFAULT_PORT = 1883
-TOPIC_PREFIX = "twitter/"  # expect topics like twitter/<hashtag>
+MAX_FEED_BATCH = 256  # max tweets written per batch before yielding back to Tk
 
 
-def sanitize_hashtag(tag: str) -> str:
-    tag = tag.strip()
-    if tag.startswith("#"):
-        tag = tag[1:]
-    tag = re.sub(r"\s+", "_", tag)
-    tag = re.sub(r"[^A-Za-z0-9_\-]", "", tag)
-    return tag
-
-
-class SubscriberApp(tk.Tk):
+class SubscriberApp(MqttTkApp):
     def __init__(self):
         super().__init__()
         self.title("MQTT Twitter — Subscriber")
         self.geometry("680x520")
         self.resizable(False, False)
 
-        # State
+        # State, on top of MqttTkApp's
         self.client = None
-        self.connected = False
-        self.msg_queue = queue.Queue()
-        self.status_queue = queue.Queue()
-        self.subscribed = set()
+        self.msg_queue = asyncio.Queue()
+        self._subs: dict[str, tuple[int, str]] = {}  # subscribed tag -> (row in sub_list, topic)
 
         self._build_ui()
-        self._init_mqtt()  # (no-op placeholder)
-
-        # Periodically drain queues to update UI
-        self.after(100, self._drain_status_queue)
-        self.after(100, self._drain_message_queue)
+        self._init_mqtt()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _init_mqtt(self):
-        """Placeholder for future MQTT setup (no-op)."""
-        return
+        """Create the one MQTT client that is reused across every connect/reconnect."""
+        if not mqtt:
+            return  # reported when the user clicks Connect
+        self.client = mqtt.Client()
+        self._attach(self.client)
+        self.client.on_message = self._on_message
+
+    def _clients(self):
+        return [self.client] if self.client else []
 
     def _build_ui(self):
         pad = {"padx": 12, "pady": 8}
@@ -74,11 +63,16 @@ class SubscriberApp(tk.Tk):
         self.port_var = tk.IntVar(value=DEFAULT_PORT)
         ttk.Entry(con_frame, textvariable=self.port_var, width=8).grid(row=0, column=3, **pad)
 
-        self.connect_btn = ttk.Button(con_frame, text="Connect", command=self._toggle_connection)
+        self.connect_btn = ttk.Button(con_frame, text="Connect", command=lambda: self._spawn(self._toggle_connection()))
         self.connect_btn.grid(row=0, column=4, **pad)
 
         self.status_lbl = ttk.Label(con_frame, text="Status: Disconnected", foreground="red")
-        self.status_lbl.grid(row=1, column=0, columnspan=5, sticky="w", padx=12, pady=(0, 10))
+        self.status_lbl.grid(row=1, column=0, columnspan=2, sticky="w", padx=12, pady=(0, 10))
+
+        ttk.Label(con_frame, text="Refresh (ms):").grid(row=1, column=2, sticky="w", padx=12, pady=(0, 10))
+        self.poll_var = tk.IntVar(value=self.poll_interval_ms)
+        self.poll_var.trace_add("write", self._on_poll_interval_change)
+        ttk.Entry(con_frame, textvariable=self.poll_var, width=8).grid(row=1, column=3, padx=12, pady=(0, 10))
 
         # Subscription frame
         sub_frame = ttk.LabelFrame(self, text="Hashtag Subscription")
@@ -87,15 +81,17 @@ class SubscriberApp(tk.Tk):
         ttk.Label(sub_frame, text="Hashtag:").grid(row=0, column=0, sticky="w", **pad)
         self.hashtag_var = tk.StringVar()
         ttk.Entry(sub_frame, textvariable=self.hashtag_var, width=28).grid(row=0, column=1, **pad)
-        ttk.Label(sub_frame, text="(e.g., #iot or iot)").grid(row=0, column=2, sticky="w")
+        self.tag_hint_lbl = ttk.Label(sub_frame, text=HASHTAG_HINT, width=22)
+        self.tag_hint_lbl.grid(row=0, column=2, sticky="w")
+        self.hashtag_var.trace_add("write", self._schedule_validate)
 
-        ttk.Button(sub_frame, text="Subscribe", command=self._subscribe).grid(row=0, column=3, **pad)
-        ttk.Button(sub_frame, text="Unsubscribe", command=self._unsubscribe).grid(row=0, column=4, **pad)
+        ttk.Button(sub_frame, text="Subscribe", command=lambda: self._spawn(self._subscribe())).grid(row=0, column=3, **pad)
+        ttk.Button(sub_frame, text="Unsubscribe", command=lambda: self._spawn(self._unsubscribe())).grid(row=0, column=4, **pad)
 
         # Subscribed list
         list_frame = ttk.LabelFrame(self, text="Subscribed Hashtags")
         list_frame.pack(fill="x", padx=12, pady=(0, 10))
-        self.sub_list = tk.Listbox(list_frame, height=5)
+        self.sub_list = tk.Listbox(list_frame, height=5, selectmode="extended")
         self.sub_list.pack(fill="x", padx=10, pady=8)
 
         # Messages frame
@@ -105,156 +101,208 @@ class SubscriberApp(tk.Tk):
         self.msg_text = tk.Text(msg_frame, height=14, state="disabled", wrap="word")
         self.msg_text.pack(fill="both", expand=True, padx=10, pady=8)
 
-    def _log_msg(self, line: str):
+    def _log(self, line: str):
+        self._log_lines([line])
+
+    def _log_lines(self, lines):
+        # One Tk insert per batch: every widget call is a Tcl roundtrip, so a burst
+        # of tweets shares a single timestamp, insert, see and reflow.
+        stamp = time.strftime("[%H:%M:%S] ")
         self.msg_text.configure(state="normal")
-        self.msg_text.insert("end", time.strftime("[%H:%M:%S] ") + line + "\n")
+        self.msg_text.insert("end", "".join(stamp + line + "\n" for line in lines))
+        lines_now = int(self.msg_text.index("end-1c").split(".")[0])
+        if lines_now > MAX_LOG_LINES:
+            self.msg_text.delete("1.0", f"{lines_now - MAX_LOG_LINES}.0")
         self.msg_text.see("end")
         self.msg_text.configure(state="disabled")
 
+    async def tk_loop(self):
+        self.loop = asyncio.get_running_loop()
+        self._spawn(self._consume_messages())
+        await super().tk_loop()
+
     # ---------- MQTT ----------
-    def _toggle_connection(self):
+    async def _toggle_connection(self):
         if not mqtt:
-            messagebox.showerror("Missing dependency", "paho-mqtt is not installed.\n\npip install paho-mqtt")
+            self._set_error("paho-mqtt is not installed — pip install paho-mqtt")
             return
-        if self.connected:
-            try:
-                self.client.disconnect()
-            except Exception:
-                pass
+        if self.connected or self._reconnect_task:
+            self._want_connection = False
+            self._cancel_reconnect()
+            self._disconnect_clients()
             self.connected = False
             self.connect_btn.config(text="Connect")
             self.status_lbl.config(text="Status: Disconnected", foreground="red")
-            self._log_msg("Disconnected from broker.")
+            self._log("Disconnected from broker.")
         else:
             broker = self.broker_var.get().strip()
             port = int(self.port_var.get() or DEFAULT_PORT)
-            self._connect_async(broker, port)
-
-    def _connect_async(self, broker, port):
-        self.status_lbl.config(text="Status: Connecting...", foreground="orange")
-        self._log_msg(f"Connecting to {broker}:{port} ...")
-
-        def worker():
-            try:
-                self.client = mqtt.Client()
-                self.client.on_connect = self._on_connect
-                self.client.on_disconnect = self._on_disconnect
-                self.client.on_message = self._on_message
-                self.client.connect(broker, port, keepalive=60)
-                self.client.loop_start()
-            except Exception as e:
-                self.status_queue.put(("error", f"Connection failed: {e}"))
-
-        threading.Thread(target=worker, daemon=True).start()
-
-    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+            self._want_connection = True
+            await self._connect_async(broker, port)
+
+    async def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if self._closed:
+            return  # the window is gone
+        if not self._want_connection:
+            client.disconnect()  # a redial that was still in flight when the user clicked Disconnect
+            return
         if reason_code == 0:
-            self.status_queue.put(("connected", "Connected to broker."))
+            self.connected = True
+            self._reconnect_delay = RECONNECT_MIN_DELAY
+            self._settle_redial()
+            self.connect_btn.config(text="Disconnect")
+            self.status_lbl.config(text="Status: Connected", foreground="green")
+            self._log("Connected to broker.")
+            # Subscribe to every listed tag: ones queued while offline on the first
+            # connect, all of them again after a reconnect.
+            await self._subscribe_many(list(self._subs))
+        elif self._reconnect_task:
+            self._log(f"Reconnect refused (code {reason_code}).")
+            self._settle_redial()
         else:
-            self.status_queue.put(("error", f"Failed to connect. Code: {reason_code}"))
+            self._set_error(f"Failed to connect. Code: {reason_code}")
 
-    def _on_disconnect(self, client, userdata, reason_code, properties=None):
-        self.status_queue.put(("disconnected", "Disconnected from broker."))
+    async def _on_disconnect(self, client, userdata, reason_code, properties=None):
+        if self._closed:
+            return  # the window is gone
+        was_connected = self.connected
+        self.connected = False
+        if not self._want_connection:
+            return  # Disconnect was clicked or the connect failed; the window already says so
+        if reason_code != 0 and was_connected:
+            # Unexpected drop: keep the client and redial it with backoff.
+            self._log(f"Connection lost (code {reason_code}).")
+            self._reconnect_task = self._spawn(self._reconnect_with_backoff())
+            return
+        if self._reconnect_task:
+            # A redial the broker closed before its CONNACK: let the task back off and retry.
+            if reason_code != 0 and self._settle_redial():
+                self._log(f"Reconnect failed: connection closed (code {reason_code}).")
+            return
+        self._want_connection = False
+        self.connect_btn.config(text="Connect")
+        self.status_lbl.config(text="Status: Disconnected", foreground="red")
+        self._log("Disconnected from broker.")
 
     def _on_message(self, client, userdata, message):
+        # Hot path: no task per message, just hand the line to the feed consumer.
+        # paho reads the socket on the loop thread, so queue directly: the
+        # threadsafe variant would write the loop's self-pipe once per tweet.
         try:
             payload = message.payload.decode("utf-8", errors="replace")
         except Exception:
             payload = "<binary payload>"
         topic = message.topic
-        self.msg_queue.put(f"[{topic}] {payload}")
-
-    def _drain_status_queue(self):
-        try:
-            while True:
-                kind, msg = self.status_queue.get_nowait()
-                if kind == "connected":
-                    self.connected = True
-                    self.connect_btn.config(text="Disconnect")
-                    self.status_lbl.config(text="Status: Connected", foreground="green")
-                    self._log_msg(msg)
-                    # Re-subscribe to any previously subscribed topics on reconnect
-                    for tag in list(self.subscribed):
-                        self._subscribe_to_topic(tag)
-                elif kind == "disconnected":
-                    self.connected = False
-                    self.connect_btn.config(text="Connect")
-                    self.status_lbl.config(text="Status: Disconnected", foreground="red")
-                    self._log_msg(msg)
-                elif kind == "error":
-                    self.connected = False
-                    self.connect_btn.config(text="Connect")
-                    self.status_lbl.config(text=f"Status: Error — see feed", foreground="red")
-                    self._log_msg(msg)
-        except queue.Empty:
-            pass
-        finally:
-            self.after(150, self._drain_status_queue)
-
-    def _drain_message_queue(self):
-        try:
-            while True:
-                line = self.msg_queue.get_nowait()
-                self._log_msg(line)
-        except queue.Empty:
-            pass
-        finally:
-            self.after(120, self._drain_message_queue)
+        for tweet in payload.split(TWEET_SEPARATOR):
+            self.msg_queue.put_nowait(f"[{topic}] {tweet}")
+
+    async def _consume_messages(self):
+        while True:
+            lines = [await self.msg_queue.get()]
+            # Burst-drain whatever else is already queued, but cap the batch so a
+            # flood cannot starve Tk of event processing.
+            while len(lines) < MAX_FEED_BATCH:
+                try:
+                    lines.append(self.msg_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            self._log_lines(lines)
+            await asyncio.sleep(0)
+
+    def _set_error(self, msg: str):
+        self.connected = False
+        self._want_connection = False
+        self.connect_btn.config(text="Connect")
+        self.status_lbl.config(text="Status: Error — see feed", foreground="red")
+        self._log(msg)
 
     # ---------- Subscribe/Unsubscribe ----------
-    def _subscribe(self):
+    async def _subscribe(self):
         tag = sanitize_hashtag(self.hashtag_var.get())
         if not tag:
-            messagebox.showwarning("Invalid hashtag", "Please enter a valid hashtag (e.g., #iot or iot).")
+            self._log("Invalid hashtag — please enter a valid hashtag (e.g., #iot or iot).")
             return
-        if tag in self.subscribed:
-            messagebox.showinfo("Already subscribed", f"You're already following #{tag}.")
+        if tag in self._subs:
+            self._log(f"Already subscribed — you're already following #{tag}.")
             return
-        self.subscribed.add(tag)
+        # Build the topic string once here; reconnects and unsubscribes reuse it.
+        self._subs[tag] = (self.sub_list.size(), f"{TOPIC_PREFIX}{tag}")
         self.sub_list.insert("end", f"#{tag}")
-        self._subscribe_to_topic(tag)
+        await self._subscribe_to_topic(tag)
 
-    def _subscribe_to_topic(self, tag: str):
+    async def _subscribe_to_topic(self, tag: str):
         if not self.connected or not self.client:
-            self._log_msg(f"(queued) Will subscribe to #{tag} when connected.")
+            self._log(f"(queued) Will subscribe to #{tag} when connected.")
             return
-        topic = f"{TOPIC_PREFIX}{tag}"
+        topic = self._subs[tag][1]
         try:
             self.client.subscribe(topic, qos=0)
-            self._log_msg(f"Subscribed to '{topic}'")
+            self._wake_pump(self.client)
+            self._log(f"Subscribed to '{topic}'")
+        except Exception as e:
+            self._log(f"Subscribe error for '{topic}': {e}")
+
+    async def _subscribe_many(self, tags):
+        """Subscribe to several tags with a single SUBSCRIBE packet."""
+        if not tags:
+            return
+        topics = [(self._subs[tag][1], 0) for tag in tags]
+        try:
+            self.client.subscribe(topics)
+            self._wake_pump(self.client)
+            if len(topics) == 1:
+                self._log(f"Subscribed to '{topics[0][0]}'")
+            else:
+                self._log(f"Subscribed to {len(topics)} topics in one packet")
+        except Exception as e:
+            self._log(f"Subscribe error for {len(topics)} topics: {e}")
+
+    async def _unsubscribe_many(self, topics):
+        """Unsubscribe from several topics with a single UNSUBSCRIBE packet."""
+        try:
+            self.client.unsubscribe(topics)
+            self._wake_pump(self.client)
+            if len(topics) == 1:
+                self._log(f"Unsubscribed from '{topics[0]}'")
+            else:
+                self._log(f"Unsubscribed from {len(topics)} topics in one packet")
         except Exception as e:
-            self._log_msg(f"Subscribe error for '{topic}': {e}")
+            self._log(f"Unsubscribe error for {', '.join(topics)}: {e}")
 
-    def _unsubscribe(self):
-        # If an item is selected, remove that. Otherwise use the entry box.
+    async def _unsubscribe(self):
+        # If items are selected, remove those. Otherwise use the entry box.
         selection = self.sub_list.curselection()
         if selection:
-            label = self.sub_list.get(selection[0])
-            tag = label.lstrip("#")
+            tags = [self.sub_list.get(i).lstrip("#") for i in selection]
         else:
-            tag = sanitize_hashtag(self.hashtag_var.get())
+            tags = [sanitize_hashtag(self.hashtag_var.get())]
+        tags = [tag for tag in tags if tag in self._subs]
 
-        if not tag or tag not in self.subscribed:
-            messagebox.showinfo("Not subscribed", "Select a hashtag in the list or type one you're subscribed to.")
+        if not tags:
+            self._log("Not subscribed — select a hashtag in the list or type one you're subscribed to.")
             return
 
-        self.subscribed.remove(tag)
-        # remove from listbox
-        for i in range(self.sub_list.size()):
-            if self.sub_list.get(i).lstrip("#") == tag:
-                self.sub_list.delete(i)
-                break
+        topics = []
+        for tag in tags:
+            # remove from listbox by its known row, then shift the rows below it up
+            idx, topic = self._subs.pop(tag)
+            topics.append(topic)
+            self.sub_list.delete(idx)
+            for t, (i, t_topic) in self._subs.items():
+                if i > idx:
+                    self._subs[t] = (i - 1, t_topic)
 
         if self.connected and self.client:
-            topic = f"{TOPIC_PREFIX}{tag}"
-            try:
-                self.client.unsubscribe(topic)
-                self._log_msg(f"Unsubscribed from '{topic}'")
-            except Exception as e:
-                self._log_msg(f"Unsubscribe error for '{topic}': {e}")
+            await self._unsubscribe_many(topics)
         else:
-            self._log_msg(f"(queued removal) #{tag} will not be re-subscribed on connect.")
+            listed = ", ".join(f"#{tag}" for tag in tags)
+            self._log(f"(queued removal) {listed} will not be re-subscribed on connect.")
 
-if __name__ == "__main__":
+
+async def main():
     app = SubscriberApp()
-    app.mainloop()
+    await app.tk_loop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())